@@ -1,39 +1,115 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, abort, request, jsonify, send_file, send_from_directory
 from werkzeug.utils import secure_filename
-import pandas as pd
+from openpyxl import load_workbook
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # optional; openpyxl's read-only mode is used instead
+    CalamineWorkbook = None
 import os
+import pickle
 import re
-from datetime import datetime
+from dataclasses import astuple, dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import groupby, islice
+from operator import itemgetter
 from zoneinfo import ZoneInfo
+from reportlab import rl_config
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import tempfile
+import threading
 import zipfile
 import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import unicodedata
 import uuid
-from collections import defaultdict, Counter
-from dateutil.relativedelta import relativedelta
+from urllib.parse import quote, unquote
+from collections import Counter
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max
+# Hand /download file transfers to the front-end web server. VOD_X_SENDFILE=1
+# makes Flask emit X-Sendfile (Apache mod_xsendfile, lighttpd);
+# VOD_X_ACCEL_PREFIX names an nginx internal location aliased to the output
+# folder, e.g. "location /protected/ { internal; alias /path/to/outputs/; }".
+app.config['USE_X_SENDFILE'] = os.environ.get('VOD_X_SENDFILE') == '1'
+app.config['X_ACCEL_PREFIX'] = os.environ.get('VOD_X_ACCEL_PREFIX', '')
+# Processes in each server process's PDF pool. gunicorn.conf.py lowers this,
+# since every gunicorn worker has a pool of its own.
+app.config['PDF_WORKERS'] = int(os.environ.get('VOD_PDF_WORKERS') or os.cpu_count())
 os.makedirs('uploads', exist_ok=True)
 os.makedirs('outputs', exist_ok=True)
 
+# Worker processes for parsing uploads and rendering their PDFs. Created on
+# first use so every server process (e.g. forked gunicorn workers) gets its own,
+# and spawned rather than forked so they never inherit a threaded server's locks.
+PDF_POOL = None
+_pdf_pool_lock = threading.Lock()
+
 LOGO_PATH = 'static/logo-1.png'
 
+# "Generated:" timestamps on VODs are in Eastern time
+EASTERN = ZoneInfo('America/New_York')
+
+# Month abbreviations for catch-up labels (fixed, unlike locale-dependent %b)
+MONTH_ABBR = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Labeled header fields found in rows 7-12 of an RFMS export
+HEADER_PREFIXES = {
+    'Name:': 'Name',
+    'Account Type:': 'Account Type',
+    'Account #:': 'Account #',
+    'Allowance:': 'Allowance',
+    'Direct Deposit #:': 'Direct Deposit #',
+    'Date Opened:': 'Date Opened',
+    'Current Balance:': 'Current Balance',
+    'Res ID:': 'Res ID',
+    'Status Reason:': 'Status Reason',
+    'Status:': 'Status',
+    'Restraints:': 'Restraints',
+    'Interest:': 'Interest',
+    'Interest :': 'Interest',
+}
+
+# Date, Description and Credits columns of the RFMS transaction table
+TRANSACTION_COLUMNS = itemgetter(2, 3, 7)
+
+# Only AUTO PMT / SURPLUS deposits appear on a VOD
+QUALIFYING_DESCRIPTION = re.compile(r'AUTO PMT|SURPLUS', re.IGNORECASE)
+
+# Write image streams as raw Flate data rather than ASCII85 text: smaller
+# PDFs, and no pure-Python encoding pass over the logo for every document
+rl_config.useA85 = 0
+
 # Register embedded TTF fonts for Adobe compatibility
 FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
-pdfmetrics.registerFont(TTFont('DejaVuSans', os.path.join(FONT_DIR, 'DejaVuSans.ttf')))
-pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', os.path.join(FONT_DIR, 'DejaVuSans-Bold.ttf')))
-pdfmetrics.registerFont(TTFont('DejaVuSans-Oblique', os.path.join(FONT_DIR, 'DejaVuSans-Oblique.ttf')))
-pdfmetrics.registerFont(TTFont('DejaVuSans-BoldOblique', os.path.join(FONT_DIR, 'DejaVuSans-BoldOblique.ttf')))
+
+
+def font_path(name):
+    """Prefer the unhinted copy of a font (see fonts/strip_hinting.py)."""
+    unhinted_path = os.path.join(FONT_DIR, f'{name}.unhinted.ttf')
+    if os.path.exists(unhinted_path):
+        return unhinted_path
+    return os.path.join(FONT_DIR, f'{name}.ttf')
+
+
+pdfmetrics.registerFont(TTFont('DejaVuSans', font_path('DejaVuSans')))
+pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', font_path('DejaVuSans-Bold')))
+pdfmetrics.registerFont(TTFont('DejaVuSans-Oblique', font_path('DejaVuSans-Oblique')))
+pdfmetrics.registerFont(TTFont('DejaVuSans-BoldOblique', font_path('DejaVuSans-BoldOblique')))
 pdfmetrics.registerFontFamily(
     'DejaVuSans',
     normal='DejaVuSans',
@@ -43,86 +119,201 @@ pdfmetrics.registerFontFamily(
 )
 
 
-def parse_rfms_excel(filepath):
-    """Parse RFMS Excel file and extract header info + transactions."""
-    df_raw = pd.read_excel(filepath, header=None)
+@lru_cache(maxsize=1)
+def _load_logo(path, mtime):
+    """Decode the logo once per file version."""
+    reader = ImageReader(path)
+    reader.getRGBData()
+    return reader
+
+
+def logo_reader():
+    """Return the decoded logo, reloading it if the file has changed, or None."""
+    try:
+        mtime = os.path.getmtime(LOGO_PATH)
+    except OSError:
+        return None
+    return _load_logo(LOGO_PATH, mtime)
+
+
+# Decode at import so preloaded server workers share it
+logo_reader()
+
+# Paragraph styles shared by every generated PDF
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=getSampleStyleSheet()['Heading1'],
+    fontSize=18,
+    alignment=TA_CENTER,
+    spaceAfter=20,
+    textColor=colors.HexColor('#4a6741'),
+    fontName='DejaVuSans-Bold'
+)
+# Style for date cells with labels
+DATE_STYLE = ParagraphStyle(
+    'DateCell',
+    fontName='DejaVuSans',
+    fontSize=9,
+    leading=11,
+)
+LABEL_NOTE_STYLE = ParagraphStyle(
+    'LabelNote',
+    fontName='DejaVuSans-Oblique',
+    fontSize=8,
+    leading=10,
+    textColor=colors.HexColor('#555555'),
+)
+DESC_STYLE = ParagraphStyle(
+    'DescCell',
+    fontName='DejaVuSans',
+    fontSize=9,
+    leading=11,
+)
+CREDITS_STYLE = ParagraphStyle(
+    'CreditsCell',
+    fontName='DejaVuSans',
+    fontSize=9,
+    leading=11,
+    alignment=2,  # RIGHT
+)
+NO_TRANS_STYLE = ParagraphStyle('NoTrans', fontName='DejaVuSans-Oblique', fontSize=10)
+FOOTER_STYLE = ParagraphStyle('Footer', fontSize=8, textColor=colors.gray, fontName='DejaVuSans-Oblique')
+
+# Table styles for the Platypus layout
+HEADER_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'DejaVuSans-Bold'),
+    ('FONTNAME', (2, 0), (2, -1), 'DejaVuSans-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'DejaVuSans'),
+    ('FONTNAME', (3, 0), (3, -1), 'DejaVuSans'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#555555')),
+    ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#555555')),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+TRANS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a6741')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'DejaVuSans-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'DejaVuSans'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+    ('TOPPADDING', (0, 1), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+# Continuation chunks of the transactions table: body rows only. The chunk
+# size is even so the row shading carries on unbroken.
+TRANS_TABLE_CHUNK_ROWS = 100
+TRANS_BODY_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
+    ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+
+def iter_rfms_rows(source):
+    """Return an iterator over the rows of the first sheet of an RFMS export.
     
-    header_info = {}
+    source is a path or a binary file object. Uses calamine's native
+    reader when python-calamine is installed, falling back to openpyxl in
+    read-only mode if it is missing or cannot open the workbook. Empty
+    cells come back as None (openpyxl) or '' (calamine).
+    """
+    if CalamineWorkbook is not None:
+        try:
+            # skip_empty_area=False keeps rows and columns anchored at A1;
+            # iter_rows() drops blank leading columns, which would shift
+            # TRANSACTION_COLUMNS onto the wrong cells.
+            with CalamineWorkbook.from_object(source) as workbook:
+                return iter(workbook.get_sheet_by_index(0).to_python(skip_empty_area=False))
+        except Exception:
+            pass
+    return _iter_openpyxl_rows(source)
+
+
+def _iter_openpyxl_rows(source):
+    """Stream first-sheet rows with openpyxl in read-only mode."""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _row_values(row):
+    """Yield the non-empty cells of a header row as stripped strings."""
+    for val in row:
+        if val is None or val == '':
+            continue
+        yield str(val).strip()
+
+
+@dataclass(slots=True)
+class Transaction:
+    """One qualifying deposit from an RFMS export, plus its review state."""
+    date: str  # MM/DD/YYYY as shown on the VOD
+    date_obj: datetime | None
+    description: str
+    credits: str  # formatted, e.g. '$1,234.00'
+    credits_float: float
+    status: str = 'auto_ok'
+    label: str | None = None
+    show_enrollment_option: bool = False
+
+
+def parse_rfms_excel(source):
+    """Parse RFMS Excel file (path or file object) and extract header info + transactions."""
+    rows = iter_rfms_rows(source)
+    
+    # Rows 7-12 (index 7-12): labeled account header fields
+    header_rows = list(islice(rows, 7, 13))
     
-    # Row 7 (index 7): Name, Account Type, Account #
-    row7 = df_raw.iloc[7]
-    for val in row7.dropna():
-        val = str(val).strip()
-        if val.startswith('Name:'):
-            header_info['Name'] = val.replace('Name:', '').strip()
-        elif val.startswith('Account Type:'):
-            header_info['Account Type'] = val.replace('Account Type:', '').strip()
-        elif val.startswith('Account #:'):
-            header_info['Account #'] = val.replace('Account #:', '').strip()
-    
-    # Row 8 (index 8): Allowance, Direct Deposit #
-    row8 = df_raw.iloc[8]
-    for val in row8.dropna():
-        val = str(val).strip()
-        if val.startswith('Allowance:'):
-            header_info['Allowance'] = val.replace('Allowance:', '').strip()
-        elif val.startswith('Direct Deposit #:'):
-            header_info['Direct Deposit #'] = val.replace('Direct Deposit #:', '').strip()
-    
-    # Row 9 (index 9): Date Opened, Current Balance
-    row9 = df_raw.iloc[9]
-    for val in row9.dropna():
-        val = str(val).strip()
-        if val.startswith('Date Opened:'):
-            header_info['Date Opened'] = val.replace('Date Opened:', '').strip()
-        elif val.startswith('Current Balance:'):
-            header_info['Current Balance'] = val.replace('Current Balance:', '').strip()
-    
-    # Row 10 (index 10): Res ID, Status Reason
-    row10 = df_raw.iloc[10]
-    for val in row10.dropna():
-        val = str(val).strip()
-        if val.startswith('Res ID:'):
-            header_info['Res ID'] = val.replace('Res ID:', '').strip()
-        elif val.startswith('Status Reason:'):
-            header_info['Status Reason'] = val.replace('Status Reason:', '').strip()
-    
-    # Row 11 (index 11): Status, Restraints
-    row11 = df_raw.iloc[11]
-    for val in row11.dropna():
-        val = str(val).strip()
-        if val.startswith('Status:'):
-            header_info['Status'] = val.replace('Status:', '').strip()
-        elif val.startswith('Restraints:'):
-            header_info['Restraints'] = val.replace('Restraints:', '').strip()
-    
-    # Row 12 (index 12): Interest
-    row12 = df_raw.iloc[12]
-    for val in row12.dropna():
-        val = str(val).strip()
-        if val.startswith('Interest'):
-            header_info['Interest'] = val.replace('Interest :', '').replace('Interest:', '').strip()
+    header_info = {}
+    for row in header_rows:
+        for val in _row_values(row):
+            # Every prefix ends at the cell's first colon, so one dict probe
+            # on the label replaces a startswith scan over all prefixes.
+            label, sep, rest = val.partition(':')
+            key = HEADER_PREFIXES.get(label + sep)
+            if key is not None:
+                header_info[key] = rest.strip()
     
     # Transaction table starts at row 14 (index 14 is header)
     transactions = []
-    for idx in range(15, len(df_raw)):
-        row = df_raw.iloc[idx]
-        date_val = row[2]
-        desc_val = row[3]
-        credits_val = row[7]
+    for row in islice(rows, 2, None):
+        if len(row) < 8:
+            continue
+        date_val, desc_val, credits_val = TRANSACTION_COLUMNS(row)
         
         # Filter: has Credits value AND Description contains AUTO PMT or SURPLUS
-        if pd.notna(credits_val) and credits_val != '':
-            desc_str = str(desc_val) if pd.notna(desc_val) else ''
-            if 'AUTO PMT' in desc_str.upper() or 'SURPLUS' in desc_str.upper():
+        if credits_val is not None and credits_val != '':
+            desc_str = str(desc_val) if desc_val is not None else ''
+            if QUALIFYING_DESCRIPTION.search(desc_str):
                 # Format date
-                if pd.notna(date_val):
-                    if isinstance(date_val, datetime):
-                        date_str = date_val.strftime('%m/%d/%Y')
-                        date_obj = date_val
-                    else:
-                        date_str = str(date_val)
-                        date_obj = None
+                if isinstance(date_val, date):
+                    if not isinstance(date_val, datetime):
+                        date_val = datetime(date_val.year, date_val.month, date_val.day)
+                    # MM/DD/YYYY; %-formatting is several times faster than strftime
+                    date_str = '%02d/%02d/%d' % (date_val.month, date_val.day, date_val.year)
+                    date_obj = date_val
+                elif date_val is not None:
+                    date_str = str(date_val)
+                    date_obj = None
                 else:
                     date_str = ''
                     date_obj = None
@@ -135,17 +326,25 @@ def parse_rfms_excel(filepath):
                 
                 credits_formatted = f"${credits_float:,.2f}"
                 
-                transactions.append({
-                    'Date': date_str,
-                    'date_obj': date_obj,
-                    'Description': desc_str,
-                    'Credits': credits_formatted,
-                    'credits_float': credits_float
-                })
+                transactions.append(Transaction(
+                    date=date_str,
+                    date_obj=date_obj,
+                    description=desc_str,
+                    credits=credits_formatted,
+                    credits_float=credits_float
+                ))
     
     return header_info, transactions
 
 
+@lru_cache(maxsize=None)
+def month_label(year, month, months_back):
+    """Label for a catch-up deposit covering an earlier month, e.g. 'For: Jan 2024'."""
+    # Count months from year 0 so the shift is one subtraction
+    year, month = divmod(year * 12 + month - 1 - months_back, 12)
+    return f"For: {MONTH_ABBR[month]} {year}"
+
+
 def analyze_transactions(transactions):
     """Analyze transactions and determine which need review.
     
@@ -154,64 +353,73 @@ def analyze_transactions(transactions):
     - Multiple identical deposits in same month matching usual surplus -> auto_labeled (backwards)
     - Any deposit not matching usual surplus in a multi-deposit month -> needs_input
     
+    The Transactions are updated in place.
+    
     Returns:
         needs_review: bool
-        analyzed: list of transaction dicts with 'status', 'label', 'show_enrollment_option'
+        analyzed: the same list, with status, label and show_enrollment_option set
     """
     if not transactions:
         return False, []
     
-    # Step 1: Find the usual surplus (most common credit amount)
-    amounts = [t['credits_float'] for t in transactions]
-    amount_counts = Counter(amounts)
-    usual_surplus = amount_counts.most_common(1)[0][0] if amount_counts else 0
+    # Step 1: Reset the review fields on the parsed transactions themselves;
+    # they come fresh from parse_rfms_excel, so there is nothing to copy
+    analyzed = transactions
+    needs_review = False
     
-    # Step 2: Group transactions by calendar month (YYYY-MM)
-    month_groups = defaultdict(list)
-    for i, t in enumerate(transactions):
-        if t['date_obj']:
-            month_key = t['date_obj'].strftime('%Y-%m')
-            month_groups[month_key].append(i)
-        else:
-            month_groups['unknown'].append(i)
+    for t in analyzed:
+        t.status = 'auto_ok'
+        t.label = None
+        t.show_enrollment_option = False
     
-    # Step 3: Initialize analyzed list
-    analyzed = []
-    needs_review = False
+    # Step 2: Bucket by calendar month (YYYY-MM). The common case is one
+    # dated deposit per month, where everything stays auto_ok whatever the
+    # amounts, so skip the surplus count and month grouping entirely.
+    month_keys = [
+        t.date_obj.strftime('%Y-%m') if t.date_obj else 'unknown'
+        for t in transactions
+    ]
+    if 'unknown' not in month_keys and len(set(month_keys)) == len(month_keys):
+        return False, analyzed
     
-    for t in transactions:
-        entry = dict(t)
-        entry['status'] = 'auto_ok'
-        entry['label'] = None
-        entry['show_enrollment_option'] = False
-        analyzed.append(entry)
+    # Step 3: Find the usual surplus (most common credit amount). amounts is
+    # indexed like transactions and reused for every comparison below.
+    amounts = [t.credits_float for t in transactions]
+    amount_counts = Counter(amounts)
+    usual_surplus = amount_counts.most_common(1)[0][0] if amount_counts else 0
     
-    # Step 4: Analyze each month group
-    for month_key, indices in month_groups.items():
+    # Step 4: Order transactions by month, then date, so each month is one
+    # contiguous run. RFMS exports are already in date order, which the
+    # stable sort gets through in a single pass.
+    ordered = sorted(
+        range(len(transactions)),
+        key=lambda i: (month_keys[i], transactions[i].date_obj or datetime.min)
+    )
+    
+    # Step 5: Analyze each month group (indices already sorted by date)
+    for month_key, group in groupby(ordered, key=month_keys.__getitem__):
+        sorted_indices = list(group)
+        
         if month_key == 'unknown':
-            for idx in indices:
-                analyzed[idx]['status'] = 'needs_input'
-                amt = analyzed[idx]['credits_float']
-                analyzed[idx]['show_enrollment_option'] = amt <= 300 and amt == int(amt)
+            for idx in sorted_indices:
+                analyzed[idx].status = 'needs_input'
+                amt = amounts[idx]
+                analyzed[idx].show_enrollment_option = amt <= 300 and amt == int(amt)
                 needs_review = True
             continue
         
-        if len(indices) == 1:
+        if len(sorted_indices) == 1:
             # Single deposit in a month - no label needed
-            analyzed[indices[0]]['status'] = 'auto_ok'
+            analyzed[sorted_indices[0]].status = 'auto_ok'
             continue
         
         # Multiple deposits in the same month
-        amounts_this_month = [transactions[i]['credits_float'] for i in indices]
+        amounts_this_month = [amounts[i] for i in sorted_indices]
         all_same = len(set(amounts_this_month)) == 1
         
-        # Sort indices by date within the month
-        sorted_indices = sorted(indices, key=lambda i: transactions[i]['date_obj'] or datetime.min)
-        
         # Parse the month for label generation
         year = int(month_key[:4])
         month = int(month_key[5:])
-        current_month_date = datetime(year, month, 1)
         
         if all_same and amounts_this_month[0] == usual_surplus:
             # All identical and match usual surplus -> auto-label backwards
@@ -219,81 +427,50 @@ def analyze_transactions(transactions):
             for pos, idx in enumerate(sorted_indices):
                 months_back = num - 1 - pos
                 if months_back > 0:
-                    for_date = current_month_date - relativedelta(months=months_back)
-                    analyzed[idx]['label'] = f"For: {for_date.strftime('%b %Y')}"
-                    analyzed[idx]['status'] = 'auto_labeled'
+                    analyzed[idx].label = month_label(year, month, months_back)
+                    analyzed[idx].status = 'auto_labeled'
                     needs_review = True
                 else:
                     # Last one = current month, no label needed
-                    analyzed[idx]['status'] = 'auto_ok'
+                    analyzed[idx].status = 'auto_ok'
         else:
             # Different amounts in same month
-            surplus_indices = [i for i in sorted_indices if transactions[i]['credits_float'] == usual_surplus]
-            non_surplus_indices = [i for i in sorted_indices if transactions[i]['credits_float'] != usual_surplus]
+            surplus_indices = [i for i in sorted_indices if amounts[i] == usual_surplus]
+            non_surplus_indices = [i for i in sorted_indices if amounts[i] != usual_surplus]
             
             # Handle surplus-matching deposits
             if len(surplus_indices) == 1:
                 # Single surplus deposit this month - it's for this month
-                analyzed[surplus_indices[0]]['status'] = 'auto_ok'
+                analyzed[surplus_indices[0]].status = 'auto_ok'
             elif len(surplus_indices) > 1:
                 # Multiple surplus deposits - backwards label
                 num_surplus = len(surplus_indices)
                 for pos, idx in enumerate(surplus_indices):
                     months_back = num_surplus - 1 - pos
                     if months_back > 0:
-                        for_date = current_month_date - relativedelta(months=months_back)
-                        analyzed[idx]['label'] = f"For: {for_date.strftime('%b %Y')}"
-                        analyzed[idx]['status'] = 'auto_labeled'
+                        analyzed[idx].label = month_label(year, month, months_back)
+                        analyzed[idx].status = 'auto_labeled'
                         needs_review = True
                     else:
-                        analyzed[idx]['status'] = 'auto_ok'
+                        analyzed[idx].status = 'auto_ok'
             
             # Flag non-surplus amounts for review
             for idx in non_surplus_indices:
-                analyzed[idx]['status'] = 'needs_input'
-                amt = analyzed[idx]['credits_float']
-                analyzed[idx]['show_enrollment_option'] = amt <= 300 and amt == int(amt)
+                analyzed[idx].status = 'needs_input'
+                amt = amounts[idx]
+                analyzed[idx].show_enrollment_option = amt <= 300 and amt == int(amt)
                 needs_review = True
     
     return needs_review, analyzed
 
 
-def generate_vod_pdf(header_info, transactions, output_path):
-    """Generate VOD PDF with header info and labeled transactions."""
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=letter,
-        rightMargin=0.75*inch,
-        leftMargin=0.75*inch,
-        topMargin=0.5*inch,
-        bottomMargin=0.5*inch
-    )
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=TA_CENTER,
-        spaceAfter=20,
-        textColor=colors.HexColor('#4a6741'),
-        fontName='DejaVuSans-Bold'
-    )
-    
-    story = []
-    
-    # Logo
-    if os.path.exists(LOGO_PATH):
-        img = Image(LOGO_PATH, width=2.5*inch, height=1*inch)
-        img.hAlign = 'CENTER'
-        story.append(img)
-        story.append(Spacer(1, 0.2*inch))
-    
-    # Title
-    story.append(Paragraph("Verification of Deposit", title_style))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Header info table
+def generated_timestamp():
+    """Current Eastern time as shown in the VOD footer."""
+    return datetime.now(EASTERN).strftime('%m/%d/%Y %I:%M %p')
+
+
+def vod_header_rows(header_info):
+    """Build the label/value rows of the VOD header block."""
     header_fields = [
         ('Name', 'Account #'),
         ('Client ID', 'Status'),
@@ -318,125 +495,493 @@ def generate_vod_pdf(header_info, transactions, output_path):
             header_data.append([f"{left_field}:", left_val, f"{right_field}:", right_val])
         else:
             header_data.append([f"{left_field}:", left_val, '', ''])
+    return header_data
+
+
+class LogoFlowable(Flowable):
+    """Draw the shared decoded logo in a Platypus story.
+    
+    platypus.Image has no public way to take an existing ImageReader, so
+    this draws logo_reader()'s copy directly rather than decoding the
+    file again for every PDF.
+    """
+    
+    def __init__(self, reader, width, height):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+    
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, width=self.width, height=self.height, mask='auto')
+
+
+def build_vod_story_pdf(header_info, transactions, output_path, gen_date):
+    """Generate the VOD PDF through the Platypus layout engine."""
+    doc = SimpleDocTemplate(
+        output_path,
+        pagesize=letter,
+        rightMargin=0.75*inch,
+        leftMargin=0.75*inch,
+        topMargin=0.5*inch,
+        bottomMargin=0.5*inch,
+        pageCompression=1
+    )
+    
+    story = []
+    
+    # Logo
+    logo = logo_reader()
+    if logo is not None:
+        story.append(LogoFlowable(logo, 2.5*inch, 1*inch))
+        story.append(Spacer(1, 0.2*inch))
+    
+    # Title
+    story.append(Paragraph("Verification of Deposit", TITLE_STYLE))
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Header info table
+    header_data = vod_header_rows(header_info)
     
     header_table = Table(header_data, colWidths=[1.3*inch, 2*inch, 1.5*inch, 2*inch])
-    header_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'DejaVuSans-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'DejaVuSans-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'DejaVuSans'),
-        ('FONTNAME', (3, 0), (3, -1), 'DejaVuSans'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#555555')),
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#555555')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
+    header_table.setStyle(HEADER_TABLE_STYLE)
     story.append(header_table)
     story.append(Spacer(1, 0.4*inch))
     
     # Transactions table
-    visible_transactions = [t for t in transactions if t.get('label') != 'ENROLLMENT_FEE']
-    
-    # Style for date cells with labels
-    date_style = ParagraphStyle(
-        'DateCell',
-        fontName='DejaVuSans',
-        fontSize=9,
-        leading=11,
-    )
-    label_note_style = ParagraphStyle(
-        'LabelNote',
-        fontName='DejaVuSans-Oblique',
-        fontSize=8,
-        leading=10,
-        textColor=colors.HexColor('#555555'),
-    )
-    desc_style = ParagraphStyle(
-        'DescCell',
-        fontName='DejaVuSans',
-        fontSize=9,
-        leading=11,
-    )
-    credits_style = ParagraphStyle(
-        'CreditsCell',
-        fontName='DejaVuSans',
-        fontSize=9,
-        leading=11,
-        alignment=2,  # RIGHT
-    )
+    visible_transactions = [t for t in transactions if t.label != 'ENROLLMENT_FEE']
     
     if visible_transactions:
-        trans_data = [['Date', 'Description', 'Credits']]
+        trans_data = []
         for t in visible_transactions:
-            label = t.get('label', '')
+            label = t.label
             if label and label != 'ENROLLMENT_FEE':
                 date_cell = Paragraph(
-                    f"{t['Date']}<br/><i><font size='8' color='#555555'>({label})</font></i>",
-                    date_style
+                    f"{t.date}<br/><i><font size='8' color='#555555'>({label})</font></i>",
+                    DATE_STYLE
                 )
             else:
-                date_cell = Paragraph(t['Date'], date_style)
+                date_cell = Paragraph(t.date, DATE_STYLE)
             
-            desc_cell = Paragraph(t['Description'], desc_style)
-            credits_cell = Paragraph(t['Credits'], credits_style)
+            desc_cell = Paragraph(t.description, DESC_STYLE)
+            credits_cell = Paragraph(t.credits, CREDITS_STYLE)
             
             trans_data.append([date_cell, desc_cell, credits_cell])
         
-        trans_table = Table(trans_data, colWidths=[1.8*inch, 3.2*inch, 1.5*inch])
-        trans_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a6741')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'DejaVuSans-Bold'),
-            ('FONTNAME', (0, 1), (-1, -1), 'DejaVuSans'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
-        story.append(trans_table)
+        # Tables re-wrap their remaining rows at every page split, so lay out
+        # long ones as stacked chunks that read as a single table
+        col_widths = [1.8*inch, 3.2*inch, 1.5*inch]
+        for start in range(0, len(trans_data), TRANS_TABLE_CHUNK_ROWS):
+            chunk = trans_data[start:start + TRANS_TABLE_CHUNK_ROWS]
+            if start == 0:
+                story.append(Table([['Date', 'Description', 'Credits']] + chunk, colWidths=col_widths, style=TRANS_TABLE_STYLE))
+            else:
+                story.append(Table(chunk, colWidths=col_widths, style=TRANS_BODY_TABLE_STYLE))
     else:
-        no_trans_style = ParagraphStyle('NoTrans', fontName='DejaVuSans-Oblique', fontSize=10)
-        story.append(Paragraph("No qualifying transactions found.", no_trans_style))
+        story.append(Paragraph("No qualifying transactions found.", NO_TRANS_STYLE))
     
     # Footer
     story.append(Spacer(1, 0.5*inch))
-    eastern = ZoneInfo('America/New_York')
-    gen_date = datetime.now(eastern).strftime('%m/%d/%Y %I:%M %p')
-    footer_style = ParagraphStyle('Footer', fontSize=8, textColor=colors.gray, fontName='DejaVuSans-Oblique')
-    story.append(Paragraph(f"Generated: {gen_date}", footer_style))
+    story.append(Paragraph(f"Generated: {gen_date}", FOOTER_STYLE))
     
     doc.build(story)
     return output_path
 
 
-def generate_filename(header_info):
-    """Generate filename: LastName, FirstName - VOD MM-DD-YYYY.pdf"""
-    name = header_info.get('Name', 'Unknown')
+def _render_vod_canvas(c, header_info, transactions, gen_date):
+    """Draw the VOD straight onto a canvas with fixed coordinates.
+    
+    Mirrors the Platypus layout of build_vod_story_pdf without running
+    its frame/flowable engine. Page breaks fall between transaction rows.
+    """
+    page_width, page_height = letter
+    # Same content frame as SimpleDocTemplate: page margins plus 6pt frame padding
+    left = 0.75*inch + 6
+    right = page_width - 0.75*inch - 6
+    top = page_height - 0.5*inch - 6
+    bottom = 0.5*inch + 6
+    center = (left + right) / 2
+    grey = colors.HexColor('#555555')
+    y = top
+    
+    # Logo
+    logo = logo_reader()
+    if logo is not None:
+        c.drawImage(logo, center - 1.25*inch, y - 1*inch,
+                    width=2.5*inch, height=1*inch, mask='auto')
+        y -= 1*inch + 0.2*inch
+    
+    # Title (18pt on 22pt leading, then spaceAfter and spacer)
+    c.setFont('DejaVuSans-Bold', 18)
+    c.setFillColor(colors.HexColor('#4a6741'))
+    c.drawCentredString(center, y - 18, "Verification of Deposit")
+    y -= 22 + 20 + 0.3*inch
+    
+    # Header info block
+    col_widths = [1.3*inch, 2*inch, 1.5*inch, 2*inch]
+    col_x = [center - sum(col_widths) / 2]
+    for width in col_widths[:-1]:
+        col_x.append(col_x[-1] + width)
+    for row in vod_header_rows(header_info):
+        for col, text in enumerate(row):
+            if col % 2 == 0:
+                c.setFont('DejaVuSans-Bold', 9)
+                c.setFillColor(grey)
+            else:
+                c.setFont('DejaVuSans', 9)
+                c.setFillColor(colors.black)
+            c.drawString(col_x[col] + 6, y - 6 - 9, str(text))
+        y -= 6 + 9*1.2 + 6
+    y -= 0.4*inch
+    
+    # Transactions table
+    visible_transactions = [t for t in transactions if t.label != 'ENROLLMENT_FEE']
+    
+    if visible_transactions:
+        col_widths = [1.8*inch, 3.2*inch, 1.5*inch]
+        edges = [center - sum(col_widths) / 2]
+        for width in col_widths:
+            edges.append(edges[-1] + width)
+        
+        def draw_grid(row_top, height):
+            c.setStrokeColor(colors.HexColor('#cccccc'))
+            c.setLineWidth(0.5)
+            for x, width in zip(edges, col_widths):
+                c.rect(x, row_top - height, width, height, stroke=1, fill=0)
+        
+        # Column header row: 10pt bold on green, 10pt padding
+        header_height = 10 + 10*1.2 + 10
+        c.setFillColor(colors.HexColor('#4a6741'))
+        c.rect(edges[0], y - header_height, edges[-1] - edges[0], header_height, stroke=0, fill=1)
+        c.setFont('DejaVuSans-Bold', 10)
+        c.setFillColor(colors.white)
+        for title, x, width in zip(('Date', 'Description', 'Credits'), edges, col_widths):
+            c.drawCentredString(x + width / 2, y - 10 - 10, title)
+        draw_grid(y, header_height)
+        y -= header_height
+        
+        for i, t in enumerate(visible_transactions):
+            date_lines = [(t.date, 'DejaVuSans', 9, colors.black)]
+            label = t.label
+            if label and label != 'ENROLLMENT_FEE':
+                date_lines += [
+                    (line, 'DejaVuSans-Oblique', 8, grey)
+                    for line in simpleSplit(f"({label})", 'DejaVuSans-Oblique', 8, col_widths[0] - 12)
+                ]
+            desc_lines = simpleSplit(t.description, 'DejaVuSans', 9, col_widths[1] - 12)
+            height = 6 + max(len(date_lines), len(desc_lines), 1) * 11 + 6
+            
+            if y - height < bottom:
+                c.showPage()
+                y = top
+            
+            if i % 2:
+                c.setFillColor(colors.HexColor('#f5f5f5'))
+                c.rect(edges[0], y - height, edges[-1] - edges[0], height, stroke=0, fill=1)
+            
+            text_y = y - 6 - 9
+            for line_no, (text, font, size, color) in enumerate(date_lines):
+                c.setFont(font, size)
+                c.setFillColor(color)
+                c.drawString(edges[0] + 6, text_y - line_no * 11, text)
+            c.setFont('DejaVuSans', 9)
+            c.setFillColor(colors.black)
+            for line_no, text in enumerate(desc_lines):
+                c.drawString(edges[1] + 6, text_y - line_no * 11, text)
+            c.drawRightString(edges[3] - 6, text_y, t.credits)
+            
+            draw_grid(y, height)
+            y -= height
+    else:
+        c.setFont('DejaVuSans-Oblique', 10)
+        c.setFillColor(colors.black)
+        c.drawString(left, y - 10, "No qualifying transactions found.")
+        y -= 12
+    
+    # Footer
+    y -= 0.5*inch
+    if y - 12 < bottom:
+        c.showPage()
+        y = top
+    c.setFont('DejaVuSans-Oblique', 8)
+    c.setFillColor(colors.gray)
+    c.drawString(left, y - 8, f"Generated: {gen_date}")
+    
+    c.showPage()
+
+
+def generate_vod_pdf(header_info, transactions, output, gen_date=None):
+    """Generate VOD PDF with header info and labeled transactions.
+    
+    output is a path or a writable binary file object such as a BytesIO.
+    Draws directly on a canvas; falls back to the Platypus layout if the
+    canvas renderer fails. gen_date is the footer timestamp (see
+    generated_timestamp); it defaults to now.
+    """
+    if gen_date is None:
+        gen_date = generated_timestamp()
+    try:
+        c = canvas.Canvas(output, pagesize=letter, pageCompression=1)
+        _render_vod_canvas(c, header_info, transactions, gen_date)
+        c.save()
+    except Exception as canvas_error:
+        app.logger.exception('Canvas VOD renderer failed; falling back to Platypus')
+        if hasattr(output, 'truncate'):
+            # Drop anything a failed save left in the buffer
+            output.seek(0)
+            output.truncate()
+        try:
+            build_vod_story_pdf(header_info, transactions, output, gen_date)
+        except Exception:
+            # Report the canvas failure, not the fallback's
+            raise canvas_error
+    return output
+
+
+@lru_cache(maxsize=512)
+def format_client_name(name):
+    """Format an RFMS 'LAST, FIRST' name as 'Last, First' for filenames."""
     parts = name.split(',')
     if len(parts) >= 2:
         last_name = parts[0].strip().title()
         first_name = parts[1].strip().title()
-        formatted_name = f"{last_name}, {first_name}"
-    else:
-        formatted_name = name.title()
+        return f"{last_name}, {first_name}"
+    return name.title()
+
+
+def generate_filename(header_info, date_str=None):
+    """Generate filename: LastName, FirstName - VOD MM-DD-YYYY.pdf
     
-    date_str = datetime.now().strftime('%m-%d-%Y')
+    Pass date_str (MM-DD-YYYY) to reuse one date across a request.
+    """
+    formatted_name = format_client_name(header_info.get('Name', 'Unknown'))
+    
+    if date_str is None:
+        date_str = datetime.now().strftime('%m-%d-%Y')
     return f"{formatted_name} - VOD {date_str}.pdf"
 
 
+class ZipStreamBuffer:
+    """Write-only file object that collects ZipFile output for a streamed response.
+    
+    It is not seekable, so ZipFile writes data descriptors and each
+    member can be sent as soon as it has been added.
+    """
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        """Return and clear everything written since the last drain."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
 
+def pdf_pool():
+    """Return this process's PDF_POOL, creating it on first use."""
+    global PDF_POOL
+    with _pdf_pool_lock:
+        if PDF_POOL is None:
+            PDF_POOL = ProcessPoolExecutor(
+                max_workers=app.config['PDF_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return PDF_POOL
+
+
+def discard_pdf_pool(pool):
+    """Drop a broken PDF_POOL so the next request starts a fresh one."""
+    global PDF_POOL
+    with _pdf_pool_lock:
+        if PDF_POOL is pool:
+            PDF_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_uploads(jobs):
+    """Run process_upload on the PDF pool for each tuple of arguments in jobs.
+    
+    jobs may be a generator: each job is submitted as soon as it is produced.
+    Results come back in job order. If a worker process dies (e.g. it is
+    OOM-killed on a huge workbook) the executor is broken for good, so it
+    is discarded and the jobs it took down are reported as failed uploads.
+    """
+    pool = pdf_pool()
+    submitted = []
+    for job in jobs:
+        try:
+            future = pool.submit(process_upload, *job)
+        except BrokenProcessPool:
+            future = None
+        submitted.append((job[1], future))
+    
+    results = []
+    for filename, future in submitted:
+        try:
+            if future is None:
+                raise BrokenProcessPool('PDF pool already broken')
+            results.append(future.result())
+        except BrokenProcessPool:
+            discard_pdf_pool(pool)
+            results.append({
+                'original': filename,
+                'error': 'Processing failed. Please re-upload.',
+                'success': False,
+                'needs_review': False
+            })
+    return results
+
+
+def wants_download():
+    """True if the client asked for the PDF itself instead of a JSON result."""
+    return request.values.get('download', '').lower() in ('1', 'true', 'yes')
+
+
+def send_pdf(pdf, download_name):
+    """Send rendered PDF bytes as an attachment straight from memory."""
+    return send_file(
+        io.BytesIO(pdf),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=download_name
+    )
+
+
+def save_upload(session_id):
+    """Open a new, uniquely named upload file for the session.
+    
+    The name keeps the "<session_id>_" prefix that /generate uses to
+    name the output.
+    """
+    return tempfile.NamedTemporaryFile(
+        dir=app.config['UPLOAD_FOLDER'],
+        prefix=f"{session_id}_",
+        suffix='.xlsx',
+        delete=False
+    )
+
+
+def save_analysis(upload_path, header_info, analyzed):
+    """Cache the parsed header and analysis of a saved upload next to it.
+    
+    Transactions are stored as plain tuples: pool workers may run this
+    module as __mp_main__, so pickled Transaction instances would not
+    load in the server process.
+    """
+    rows = [astuple(t) for t in analyzed]
+    with open(upload_path + '.pkl', 'wb') as f:
+        pickle.dump((header_info, rows), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_analysis(upload_path):
+    """Return the (header_info, analyzed) cached by save_analysis, or None."""
+    try:
+        with open(upload_path + '.pkl', 'rb') as f:
+            header_info, rows = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        # Missing or truncated cache: caller re-parses the workbook
+        return None
+    return header_info, [Transaction(*row) for row in rows]
+
+
+def discard_upload(upload_path):
+    """Delete a saved upload and its cached analysis, if still present."""
+    for path in (upload_path, upload_path + '.pkl'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def process_upload(data, filename, session_id, date_str, gen_date, in_memory=False):
+    """Parse and analyze one upload, generating its PDF if no review is needed.
+    
+    The workbook is parsed straight from its bytes; it is only written to
+    the upload folder when it has to wait for review. With in_memory the
+    PDF is returned as bytes under 'pdf' instead of being saved to the
+    output folder. /upload runs it in a PDF_POOL worker process, so it only
+    takes and returns plain picklable values.
+    """
+    try:
+        header_info, transactions = parse_rfms_excel(io.BytesIO(data))
+        needs_review, analyzed = analyze_transactions(transactions)
+        
+        if needs_review:
+            # Save the file and its analysis for /generate, return analysis for review screen
+            with save_upload(session_id) as tmp:
+                tmp.write(data)
+            save_analysis(tmp.name, header_info, analyzed)
+            return {
+                'original': filename,
+                'name': header_info.get('Name', 'Unknown'),
+                'needs_review': True,
+                'saved_file': os.path.basename(tmp.name),
+                'transactions': [
+                    {
+                        'index': i,
+                        'date': t.date,
+                        'description': t.description,
+                        'credits': t.credits,
+                        'credits_float': t.credits_float,
+                        'status': t.status,
+                        'label': t.label,
+                        'show_enrollment_option': t.show_enrollment_option
+                    }
+                    for i, t in enumerate(analyzed)
+                ],
+                'success': True
+            }
+        
+        # No review needed - generate PDF immediately
+        output_filename = generate_filename(header_info, date_str)
+        if in_memory:
+            buf = io.BytesIO()
+            generate_vod_pdf(header_info, analyzed, buf, gen_date)
+            return {
+                'original': filename,
+                'output': output_filename,
+                'pdf': buf.getvalue(),
+                'name': header_info.get('Name', 'Unknown'),
+                'transaction_count': len(transactions),
+                'needs_review': False,
+                'success': True
+            }
+        
+        stored_name = f"{session_id}_{output_filename}"
+        generate_vod_pdf(header_info, analyzed, os.path.join(app.config['OUTPUT_FOLDER'], stored_name), gen_date)
+        
+        return {
+            'original': filename,
+            'output': output_filename,
+            'path': stored_name,
+            'name': header_info.get('Name', 'Unknown'),
+            'transaction_count': len(transactions),
+            'needs_review': False,
+            'success': True
+        }
+    except Exception as e:
+        return {
+            'original': filename,
+            'error': str(e),
+            'success': False,
+            'needs_review': False
+        }
+
+
 @app.route('/upload', methods=['POST'])
 def upload_files():
     """Upload and analyze files. Returns analysis for review if needed."""
@@ -447,68 +992,20 @@ def upload_files():
     if not files or files[0].filename == '':
         return jsonify({'error': 'No files selected'}), 400
     
-    results = []
     session_id = str(uuid.uuid4())[:8]
+    date_str = datetime.now().strftime('%m-%d-%Y')
+    gen_date = generated_timestamp()
+    # A single file can be sent back as the PDF itself
+    in_memory = len(files) == 1 and wants_download()
     
-    for file in files:
-        if file and file.filename.endswith('.xlsx'):
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
-            file.save(upload_path)
-            
-            try:
-                header_info, transactions = parse_rfms_excel(upload_path)
-                needs_review, analyzed = analyze_transactions(transactions)
-                
-                if needs_review:
-                    # Keep file saved, return analysis for review screen
-                    results.append({
-                        'original': filename,
-                        'name': header_info.get('Name', 'Unknown'),
-                        'needs_review': True,
-                        'saved_file': f"{session_id}_{filename}",
-                        'transactions': [
-                            {
-                                'index': i,
-                                'date': t['Date'],
-                                'description': t['Description'],
-                                'credits': t['Credits'],
-                                'credits_float': t['credits_float'],
-                                'status': t['status'],
-                                'label': t.get('label'),
-                                'show_enrollment_option': t.get('show_enrollment_option', False)
-                            }
-                            for i, t in enumerate(analyzed)
-                        ],
-                        'success': True
-                    })
-                else:
-                    # No review needed - generate PDF immediately
-                    output_filename = generate_filename(header_info)
-                    output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{session_id}_{output_filename}")
-                    generate_vod_pdf(header_info, analyzed, output_path)
-                    
-                    if os.path.exists(upload_path):
-                        os.remove(upload_path)
-                    
-                    results.append({
-                        'original': filename,
-                        'output': output_filename,
-                        'path': f"{session_id}_{output_filename}",
-                        'name': header_info.get('Name', 'Unknown'),
-                        'transaction_count': len(transactions),
-                        'needs_review': False,
-                        'success': True
-                    })
-            except Exception as e:
-                results.append({
-                    'original': filename,
-                    'error': str(e),
-                    'success': False,
-                    'needs_review': False
-                })
-                if os.path.exists(upload_path):
-                    os.remove(upload_path)
+    # Parse and render the files in parallel, straight from memory
+    results = run_uploads(
+        (file.read(), secure_filename(file.filename), session_id, date_str, gen_date, in_memory)
+        for file in files
+        if file and file.filename.endswith('.xlsx')
+    )
+    if results and 'pdf' in results[0]:
+        return send_pdf(results[0]['pdf'], results[0]['output'])
     
     return jsonify({
         'session_id': session_id,
@@ -518,9 +1015,45 @@ def upload_files():
     })
 
 
+@app.route('/upload-stream', methods=['POST'])
+def upload_stream():
+    """Upload a single file as the raw request body and analyze it.
+    
+    Bypasses multipart parsing: the body is read straight off the request
+    stream. The original filename comes URL-encoded in X-Filename.
+    Responds in the same shape as /upload, or with the PDF itself when
+    ?download=1 is given and no review is needed.
+    """
+    original = unquote(request.headers.get('X-Filename', ''))
+    if not original.endswith('.xlsx'):
+        return jsonify({'error': 'No .xlsx file provided'}), 400
+    
+    session_id = str(uuid.uuid4())[:8]
+    filename = secure_filename(original)
+    data = request.stream.read()
+    
+    date_str = datetime.now().strftime('%m-%d-%Y')
+    gen_date = generated_timestamp()
+    # A single task gains nothing from the pool, so skip the pickling hop
+    result = process_upload(data, filename, session_id, date_str, gen_date, wants_download())
+    if 'pdf' in result:
+        return send_pdf(result['pdf'], result['output'])
+    
+    return jsonify({
+        'session_id': session_id,
+        'results': [result],
+        'total': 1,
+        'successful': 1 if result['success'] else 0
+    })
+
+
 @app.route('/generate', methods=['POST'])
 def generate_with_labels():
-    """Generate PDF after user provides labels for flagged transactions."""
+    """Generate PDF after user provides labels for flagged transactions.
+    
+    With "download": true in the body the PDF is sent back directly
+    instead of being saved to the output folder.
+    """
     data = request.json
     saved_file = data.get('saved_file')
     labels = data.get('labels', {})  # {index_str: label_string or 'ENROLLMENT_FEE'}
@@ -528,35 +1061,48 @@ def generate_with_labels():
     if not saved_file:
         return jsonify({'error': 'No file specified'}), 400
     
+    if os.path.basename(saved_file) != saved_file:
+        return jsonify({'error': 'Invalid file'}), 400
+    
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], saved_file)
     if not os.path.exists(filepath):
         return jsonify({'error': 'File not found. Please re-upload.'}), 404
     
     try:
-        header_info, transactions = parse_rfms_excel(filepath)
-        _, analyzed = analyze_transactions(transactions)
+        cached = load_analysis(filepath)
+        if cached:
+            header_info, analyzed = cached
+        else:
+            header_info, transactions = parse_rfms_excel(filepath)
+            _, analyzed = analyze_transactions(transactions)
         
         # Apply user-provided labels
         for idx_str, label in labels.items():
             idx = int(idx_str)
             if 0 <= idx < len(analyzed):
-                analyzed[idx]['label'] = label
+                analyzed[idx].label = label
         
         output_filename = generate_filename(header_info)
         session_id = saved_file.split('_')[0]
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{session_id}_{output_filename}")
+        stored_name = f"{session_id}_{output_filename}"
+        if data.get('download'):
+            output = io.BytesIO()
+        else:
+            output = os.path.join(app.config['OUTPUT_FOLDER'], stored_name)
         
-        generate_vod_pdf(header_info, analyzed, output_path)
+        generate_vod_pdf(header_info, analyzed, output)
         
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        discard_upload(filepath)
+        
+        if data.get('download'):
+            return send_pdf(output.getvalue(), output_filename)
         
         return jsonify({
             'success': True,
             'output': output_filename,
-            'path': f"{session_id}_{output_filename}",
+            'path': stored_name,
             'name': header_info.get('Name', 'Unknown'),
-            'transaction_count': len([t for t in analyzed if t.get('label') != 'ENROLLMENT_FEE'])
+            'transaction_count': len([t for t in analyzed if t.label != 'ENROLLMENT_FEE'])
         })
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
@@ -564,36 +1110,79 @@ def generate_with_labels():
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=True)
+    """Send one output PDF, through the front-end web server if configured."""
+    prefix = app.config['X_ACCEL_PREFIX']
+    if not prefix:
+        return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=True)
+    
+    # nginx serves the file itself; the worker only checks it and sends headers
+    filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(filepath):
+        abort(404)
+    response = Response(mimetype='application/pdf')
+    response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(filename)
+    # Client names can fall outside Latin-1, which a header cannot carry:
+    # send an ASCII filename plus the RFC 5987 UTF-8 one, like send_file
+    try:
+        filename.encode('ascii')
+        names = {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    return response
 
 
 @app.route('/download-all', methods=['POST'])
 def download_all():
-    data = request.json
-    filenames = data.get('files', [])
+    """Stream a zip of the named output PDFs.
+    
+    Files are named in a JSON body ({"files": [...]}) or as repeated
+    "files" form fields; the page submits a form so the browser can save
+    the archive as it streams instead of buffering it.
+    """
+    if request.is_json:
+        filenames = request.json.get('files', [])
+    else:
+        filenames = request.form.getlist('files')
     
     if not filenames:
         return jsonify({'error': 'No files specified'}), 400
     
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for filename in filenames:
-            filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-            if os.path.exists(filepath):
+    def generate():
+        buffer = ZipStreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+            for filename in filenames:
+                filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
                 clean_name = '_'.join(filename.split('_')[1:]) if '_' in filename else filename
-                zf.write(filepath, clean_name)
+                try:
+                    # Carry the PDF's modification time into the archive
+                    info = zipfile.ZipInfo.from_file(filepath, clean_name)
+                    src = open(filepath, 'rb')
+                except OSError:
+                    # Missing, a directory or unreadable: skip it, since the
+                    # response headers have already gone out
+                    continue
+                info.compress_type = zipfile.ZIP_STORED
+                with src, zf.open(info, 'w') as dst:
+                    while chunk := src.read(1 << 20):
+                        dst.write(chunk)
+                        yield buffer.drain()
+                # Rest of the member plus its data descriptor
+                yield buffer.drain()
+        # Central directory
+        yield buffer.drain()
     
-    memory_file.seek(0)
     date_str = datetime.now().strftime('%m-%d-%Y')
-    return send_file(
-        memory_file,
+    return Response(
+        generate(),
         mimetype='application/zip',
-        as_attachment=True,
-        download_name=f'VOD_Batch_{date_str}.zip'
+        headers={'Content-Disposition': f'attachment; filename=VOD_Batch_{date_str}.zip'}
     )
 
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (gunicorn.conf.py)
     os.makedirs('uploads', exist_ok=True)
     os.makedirs('outputs', exist_ok=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
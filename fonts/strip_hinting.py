@@ -0,0 +1,37 @@
+"""Regenerate the unhinted DejaVuSans fonts registered by app.py.
+
+Keeps every character and glyph of the original fonts and only drops the
+TrueType hinting, which PDF viewers do not use. Requires fontTools:
+
+    pip install fonttools
+    python fonts/strip_hinting.py
+"""
+import os
+
+from fontTools import subset
+
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+FONTS = ['DejaVuSans', 'DejaVuSans-Bold', 'DejaVuSans-Oblique', 'DejaVuSans-BoldOblique']
+
+
+def main():
+    options = subset.Options()
+    options.hinting = False
+    # Keep glyphs and tables exactly as they are, apart from hinting
+    options.glyph_names = True
+    options.notdef_outline = True
+    options.layout_features = ['*']
+    options.name_IDs = ['*']
+    options.name_languages = ['*']
+    options.legacy_kern = True
+    for name in FONTS:
+        font = subset.load_font(os.path.join(FONT_DIR, f'{name}.ttf'), options)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=font.getBestCmap().keys())
+        subsetter.subset(font)
+        subset.save_font(font, os.path.join(FONT_DIR, f'{name}.unhinted.ttf'), options)
+        print(f'{name}.unhinted.ttf')
+
+
+if __name__ == '__main__':
+    main()
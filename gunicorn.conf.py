@@ -0,0 +1,12 @@
+# Production server settings, picked up by: gunicorn app:app
+import os
+
+bind = '0.0.0.0:5000'
+workers = os.cpu_count()
+# Each worker spawns its own PDF pool; keep those small so the box runs
+# about 2x cpu_count processes rather than cpu_count squared
+os.environ.setdefault('VOD_PDF_WORKERS', '2')
+# Import app.py (fonts, logo, styles) once in the master before forking
+preload_app = True
+# Large batches are parsed and rendered inside the request
+timeout = 120
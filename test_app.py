@@ -0,0 +1,181 @@
+import io
+import os
+import re
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from urllib.parse import quote
+
+import pytest
+from openpyxl import Workbook
+from reportlab.pdfbase.ttfonts import TTFont
+
+import app
+
+
+def rfms_workbook(rows, header=None):
+    """Build an in-memory RFMS export with transactions from row 16.
+
+    rows are (date, description, credits) placed in columns C, D and H;
+    header maps 0-based (row, column) to a header cell value.
+    """
+    wb = Workbook()
+    ws = wb.active
+    for (r, c), value in (header or {}).items():
+        ws.cell(row=r + 1, column=c + 1, value=value)
+    for c, title in ((2, 'Date'), (3, 'Description'), (7, 'Credits')):
+        ws.cell(row=15, column=c + 1, value=title)
+    for i, (d, desc, credits) in enumerate(rows):
+        ws.cell(row=16 + i, column=3, value=d)
+        ws.cell(row=16 + i, column=4, value=desc)
+        ws.cell(row=16 + i, column=8, value=credits)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+@pytest.fixture(params=['calamine', 'openpyxl'])
+def reader(request, monkeypatch):
+    if request.param == 'calamine':
+        if app.CalamineWorkbook is None:
+            pytest.skip('python-calamine not installed')
+    else:
+        monkeypatch.setattr(app, 'CalamineWorkbook', None)
+    return request.param
+
+
+def test_parse_keeps_columns_when_leading_columns_blank(reader):
+    # Nothing in columns A and B: the transaction columns must not shift left
+    source = rfms_workbook(
+        [
+            (datetime(2024, 1, 3), 'AUTO PMT-CHASE', 250.0),
+            (datetime(2024, 2, 3), 'SURPLUS', 250.0),
+            (datetime(2024, 2, 20), 'SURPLUS', 250.0),
+        ],
+        header={(7, 3): 'Name: DOE, JOHN'},
+    )
+    header_info, transactions = app.parse_rfms_excel(source)
+
+    assert header_info == {'Name': 'DOE, JOHN'}
+    assert [(t.date, t.description, t.credits_float) for t in transactions] == [
+        ('01/03/2024', 'AUTO PMT-CHASE', 250.0),
+        ('02/03/2024', 'SURPLUS', 250.0),
+        ('02/20/2024', 'SURPLUS', 250.0),
+    ]
+    needs_review, _ = app.analyze_transactions(transactions)
+    assert needs_review
+
+
+@pytest.mark.parametrize('name', ['DejaVuSans', 'DejaVuSans-Bold', 'DejaVuSans-Oblique', 'DejaVuSans-BoldOblique'])
+def test_registered_fonts_cover_full_character_set(name):
+    # Client names outside Latin-1 (e.g. 'NGUYỄN, ȘTEFAN') must not lose glyphs
+    full = TTFont(f'{name}-full', os.path.join(app.FONT_DIR, f'{name}.ttf'))
+    registered = app.pdfmetrics.getFont(name)
+    assert set(full.face.charToGlyph) <= set(registered.face.charToGlyph)
+
+
+class BrokenPool:
+    """Stands in for a ProcessPoolExecutor whose worker has died."""
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool('A child process terminated abruptly')
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+def test_broken_pdf_pool_fails_the_upload_and_is_replaced(monkeypatch):
+    monkeypatch.setattr(app, 'PDF_POOL', BrokenPool())
+    results = app.run_uploads([(b'', 'a.xlsx', 'abcd1234', '01-01-2025', 'G', False)])
+
+    assert results == [{
+        'original': 'a.xlsx',
+        'error': 'Processing failed. Please re-upload.',
+        'success': False,
+        'needs_review': False
+    }]
+    assert app.PDF_POOL is None
+
+
+def test_x_accel_download_encodes_non_latin1_names(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'OUTPUT_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app.app.config, 'X_ACCEL_PREFIX', '/protected/')
+    name = 'ab12_Nguyễn, Ștefan - VOD 01-01-2025.pdf'
+    (tmp_path / name).write_bytes(b'%PDF-')
+
+    response = app.app.test_client().get('/download/' + quote(name))
+
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected/' + quote(name)
+    disposition = response.headers['Content-Disposition']
+    disposition.encode('latin-1')
+    assert 'filename="ab12_Nguyen, Stefan - VOD 01-01-2025.pdf"' in disposition
+    assert "filename*=UTF-8''" + quote(name, safe='!#$&+^`|~') in disposition
+
+
+def test_download_all_keeps_pdf_modification_times(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'OUTPUT_FOLDER', str(tmp_path))
+    pdf = tmp_path / 'ab12_Doe, John - VOD 01-01-2025.pdf'
+    pdf.write_bytes(b'%PDF-')
+    mtime = datetime(2025, 1, 1, 9, 30).timestamp()
+    os.utime(pdf, (mtime, mtime))
+
+    response = app.app.test_client().post('/download-all', json={'files': [pdf.name]})
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        [info] = zf.infolist()
+        assert info.filename == 'Doe, John - VOD 01-01-2025.pdf'
+        assert info.date_time == (2025, 1, 1, 9, 30, 0)
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert zf.read(info) == b'%PDF-'
+
+
+def test_download_all_skips_names_it_cannot_read(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'OUTPUT_FOLDER', str(tmp_path))
+    (tmp_path / 'ab12_a.pdf').write_bytes(b'%PDF-')
+    (tmp_path / 'sub').mkdir()
+
+    response = app.app.test_client().post('/download-all', json={'files': ['sub', 'missing.pdf', 'ab12_a.pdf']})
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['a.pdf']
+
+
+@pytest.mark.parametrize('render', ['generate_vod_pdf', 'build_vod_story_pdf'])
+def test_pdf_records_real_creation_date(render):
+    buf = io.BytesIO()
+    getattr(app, render)({'Name': 'DOE, JOHN'}, [], buf, 'G')
+
+    match = re.search(rb'/CreationDate \(D:(\d{8})', buf.getvalue())
+    assert match
+    assert match.group(1) == datetime.now().strftime('%Y%m%d').encode()
+
+
+def test_review_cache_stores_plain_data(tmp_path):
+    # Pool workers may import this module as __mp_main__, so the cache must
+    # not hold references to the Transaction class
+    path = str(tmp_path / 'a.xlsx')
+    header_info = {'Name': 'DOE, JOHN'}
+    analyzed = [app.Transaction('01/03/2024', datetime(2024, 1, 3), 'SURPLUS', '$250.00', 250.0, 'needs_input')]
+    app.save_analysis(path, header_info, analyzed)
+
+    with open(path + '.pkl', 'rb') as f:
+        assert b'Transaction' not in f.read()
+    assert app.load_analysis(path) == (header_info, analyzed)
+    assert app.load_analysis(str(tmp_path / 'missing.xlsx')) is None
+
+
+def test_canvas_failure_is_logged_and_reraised_if_fallback_fails(monkeypatch, caplog):
+    def broken(*args):
+        raise ValueError('canvas broke')
+
+    monkeypatch.setattr(app, '_render_vod_canvas', broken)
+    buf = app.generate_vod_pdf({'Name': 'DOE, JOHN'}, [], io.BytesIO(), 'G')
+    assert buf.getvalue().startswith(b'%PDF-')
+    assert 'Canvas VOD renderer failed' in caplog.text
+
+    monkeypatch.setattr(app, 'build_vod_story_pdf', lambda *args: 1 / 0)
+    with pytest.raises(ValueError, match='canvas broke'):
+        app.generate_vod_pdf({'Name': 'DOE, JOHN'}, [], io.BytesIO(), 'G')